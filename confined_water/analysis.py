@@ -1615,8 +1615,8 @@ class Simulation:
         # based on pbc check what direction is investigated
         pbc_dimensions_indices = global_variables.DIMENSION_DICTIONARY.get(self.pbc_dimensions)
 
-        not_pbc_dimensions = list(set(self.pbc_dimensions) ^ set("xyz"))
-        not_pbc_indices = list(set(pbc_dimensions_indices) ^ set([0, 1, 2]))
+        not_pbc_dimensions = sorted(set("xyz") - set(self.pbc_dimensions))
+        not_pbc_indices = sorted(set([0, 1, 2]) - set(pbc_dimensions_indices))
 
         # if bulk, raise error
         if len(pbc_dimensions_indices) == 3:
@@ -1698,6 +1698,7 @@ class Simulation:
         start_time: int = None,
         end_time: int = None,
         frame_frequency: int = None,
+        n_cores: int = 1,
     ):
         """
         Compute the free energy profile of water on top of solid surface.
@@ -1705,6 +1706,7 @@ class Simulation:
             start_time (int) : Start time for analysis (optional).
             end_time (int) : End time for analysis (optional).
             frame_frequency (int): Take every nth frame only (optional).
+            n_cores (int): Number of processes the frames are distributed over (optional).
         Returns:
             surface_area_solid_phase (float): Surface area of the solid phase in A^2.
         """
@@ -1753,6 +1755,7 @@ class Simulation:
                 frame_frequency,
                 self.tube_radius,
                 tube_length_in_unit_cells,
+                n_cores=n_cores,
             )
 
         # save as attribute of the class instance
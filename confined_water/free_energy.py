@@ -1,3 +1,7 @@
+import concurrent.futures
+import functools
+import MDAnalysis.lib.distances as mdanalysis_distances
+import numba
 import numpy as np
 import sys
 from tqdm.notebook import tqdm
@@ -54,7 +58,7 @@ class FreeEnergyProfile:
 
         # define dimensions not periodic, indices
 
-        not_pbc_indices = list(set(pbc_indices) ^ set([0, 1, 2]))
+        not_pbc_indices = sorted(set([0, 1, 2]) - set(pbc_indices))
 
         # start by setting bins and ranges for histogram
         # thereby, it is important to distinguish between sheet and tube
@@ -294,6 +298,7 @@ def compute_spatial_distribution_of_atoms_on_interface(
     frame_frequency: int,
     tube_radius: float = None,
     tube_length_in_unit_cells: int = None,
+    n_cores: int = 1,
 ):
     """
     Compute distribution of atomic positions on interface.
@@ -305,6 +310,7 @@ def compute_spatial_distribution_of_atoms_on_interface(
         start_frame (int) : Start frame for analysis.
         end_frame (int) : End frame for analysis.
         frame_frequency (int): Take every nth frame only.
+        n_cores (int): Number of processes the frames are distributed over.
 
     """
 
@@ -326,6 +332,7 @@ def compute_spatial_distribution_of_atoms_on_interface(
             start_frame,
             end_frame,
             frame_frequency,
+            n_cores,
         )
 
     else:
@@ -338,6 +345,7 @@ def compute_spatial_distribution_of_atoms_on_interface(
             start_frame,
             end_frame,
             frame_frequency,
+            n_cores,
         )
 
     # before returning distribution assign solid positions to types
@@ -374,6 +382,8 @@ def _compute_distribution_for_system_with_one_periodic_direction(
     start_frame: int,
     end_frame: int,
     frame_frequency: int,
+    n_cores: int = 1,
+    number_of_frames_per_block: int = 256,
 ):
     """
     Compute distribution of atomic positions for 1D systems.
@@ -387,162 +397,266 @@ def _compute_distribution_for_system_with_one_periodic_direction(
         start_frame (int) : Start frame for analysis.
         end_frame (int) : End frame for analysis.
         frame_frequency (int): Take every nth frame only.
+        n_cores (int): Number of processes the frames are distributed over.
+        number_of_frames_per_block (int): Number of frames read and processed at once.
 
     """
     # define dimensions not periodic, indices
-    not_pbc_indices = list(set(pbc_indices) ^ set([0, 1, 2]))
-    periodic_vector = np.zeros(3)
-    periodic_vector[pbc_indices] = 1
-
-    # wrap atoms in box
-    # universe.atoms.pack_into_box(box=topology.get_cell_lengths_and_angles(), inplace=True)
+    not_pbc_indices = sorted(set([0, 1, 2]) - set(pbc_indices))
 
     # start by separating solid atoms from liquid atoms
     solid_atoms = universe.select_atoms("not name O H")
-    liquid_atoms = universe.select_atoms("name O H")
+
+    # cell does not change along the trajectory
+    box = topology.get_cell_lengths_and_angles()
 
     # this will serve as our anchor for translation for computing the free energy profile
-    anchor_coordinates = solid_atoms.center_of_mass()
+    # the solid might be split by the boundaries of the box in the non-periodic directions
+    anchor_coordinates = utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+        solid_atoms.positions,
+        solid_atoms.masses,
+        box[0:3],
+        "".join("xyz"[index] for index in not_pbc_indices),
+    )
 
     # define reference atoms which will be used to determine rotation
     indices_atoms_anchor_rotation = _get_atom_ids_on_same_tube_axis(
         solid_atoms, tube_length_in_unit_cells, not_pbc_indices
     )
 
-    # compute circumference based on diameter
-    tube_circumference = 2 * np.pi * tube_radius
-
-    # define arrays where the coordinates of oxygens and solid atoms will be saved in
-    liquid_contact_coord1 = []
-    liquid_contact_coord2 = []
-    solid_coord1 = []
-    solid_coord2 = []
-
-    liquid_contact_coord1_all = []
-    liquid_contact_coord2_all = []
-    solid_coord1_all = []
-    solid_coord2_all = []
-
-    number_of_samples = len(np.arange(start_frame, end_frame, frame_frequency))
-    # Loop over trajectory
-    for count_frames, frames in enumerate(
-        tqdm((universe.trajectory[start_frame:end_frame])[::frame_frequency])
-    ):
+    # frames which will be analysed
+    sampled_frames = np.arange(universe.trajectory.n_frames)[start_frame:end_frame][
+        ::frame_frequency
+    ]
+
+    return _distribute_frames_over_cores(
+        _compute_distribution_for_frames_with_one_periodic_direction,
+        universe,
+        sampled_frames,
+        n_cores,
+        box=box,
+        spatial_extent_contact_layer=spatial_extent_contact_layer,
+        tube_radius=tube_radius,
+        pbc_indices=pbc_indices,
+        anchor_coordinates=anchor_coordinates,
+        indices_atoms_anchor_rotation=indices_atoms_anchor_rotation,
+        number_of_frames_per_block=number_of_frames_per_block,
+    )
 
-        # we start by making the frames translationally and rotationally invariant
-        # 1. Translations
-        # This is done by computing the translation and substracting it
 
-        # solid
-        translation_from_frame0 = solid_atoms.center_of_mass() - anchor_coordinates
-        universe.atoms.positions -= translation_from_frame0
+def _compute_distribution_for_frames_with_one_periodic_direction(
+    universe,
+    sampled_frames,
+    box,
+    spatial_extent_contact_layer: float,
+    tube_radius: float,
+    pbc_indices,
+    anchor_coordinates,
+    indices_atoms_anchor_rotation,
+    number_of_frames_per_block: int = 256,
+):
+    """
+    Compute distribution of atomic positions for 1D systems for the given frames.
+    Arguments:
+        universe : MDAnalysis universes to be analysed.
+        sampled_frames : Indices of the frames which will be analysed.
+        box : Cell lengths and angles of the system.
+        spatial_extent_contact_layer (float): How far ranges the water contact layer.
+        tube_radius (float) : radius of the tube in A.
+        pbc_indices : Direction indices in which system is periodic
+        anchor_coordinates : Center of mass of the tube all frames are translated to.
+        indices_atoms_anchor_rotation : Tube atoms defining the axis all frames are rotated to.
+        number_of_frames_per_block (int): Number of frames read and processed at once.
 
-        # 2. Rotations (only relevant for nanotubes obviously)
+    """
+    # define dimensions not periodic, indices
+    # in ascending order, angles on the opened tube and the rotation of the tube are measured
+    # from the first towards the second of these directions, this has to be the same in all frames
+    not_pbc_indices = sorted(set([0, 1, 2]) - set(pbc_indices))
 
-        # to enable an easy rotation, translate atoms to COM
-        COM = universe.atoms.center_of_mass()
-        universe.atoms.positions -= COM
+    # directions in which the solid might be split by the boundaries of the box
+    not_pbc_dimensions = "".join("xyz"[index] for index in not_pbc_indices)
 
-        # prepare everything to compute angle between axis and anchor axis
-        solid_axis = np.mean(
-            solid_atoms.positions[indices_atoms_anchor_rotation][:, not_pbc_indices],
-            axis=0,
-        )
+    # convert index lists to arrays once, they are used for fancy indexing in every frame
+    pbc_indices = np.asarray(pbc_indices)
+    not_pbc_indices = np.asarray(not_pbc_indices)
 
-        # define normed dot product
-        normed_dot_product = np.clip(
-            np.dot(
-                solid_axis,
-                np.asarray([1, 0]),
-            )
-            / np.linalg.norm(solid_axis),
-            -1.0,
-            1.0,
-        )
+    # wrap atoms in box
+    # universe.atoms.pack_into_box(box=box, inplace=True)
 
-        # Compute angle between reference atom and axis perpendicular to periodic axis
-        # note we need the negative angle if above 180 degrees
-        angle_anchor_first_axis = (
-            np.arccos(normed_dot_product) if solid_axis[1] <= 0 else -np.arccos(normed_dot_product)
-        )
+    # start by separating solid atoms from liquid atoms
+    solid_atoms = universe.select_atoms("not name O H")
+    liquid_atoms = universe.select_atoms("name O H")
 
-        # get rotation matrix for periodic axis and computed angle
-        rotation_matrix = utils.rotation_matrix(periodic_vector, +angle_anchor_first_axis)
+    # masses do not change either, store them to compute centers of mass in the loop
+    solid_indices = solid_atoms.ix
+    liquid_indices = liquid_atoms.ix
+    solid_masses = solid_atoms.masses
+    all_masses = universe.atoms.masses
+    total_mass = all_masses.sum()
 
-        # rotate atoms, so that this can be compared
-        universe.atoms.positions = np.matmul(rotation_matrix, universe.atoms.positions.T).T
+    # atoms which are needed to compute the axis used for the rotation, as column to be
+    # combined with the non-periodic directions when gathering their positions
+    anchor_rotation_atoms = solid_atoms[indices_atoms_anchor_rotation].ix[:, np.newaxis]
 
-        # translate now back to center of mass
-        universe.atoms.positions += COM
+    # compute circumference based on diameter
+    tube_circumference = 2 * np.pi * tube_radius
 
-        # wrap atoms in box
-        universe.atoms.pack_into_box(box=topology.get_cell_lengths_and_angles(), inplace=True)
+    # expansion of an angle on the opened tube (adding pi to get only positive values)
+    # is circumference * (angle + pi) / (2 * pi), i.e. angle * scale + offset
+    angular_scale = tube_circumference / (2 * np.pi)
+    angular_offset = np.pi * angular_scale
+
+    # define containers where the coordinates of oxygens and solid atoms will be saved in
+    # the number of liquid atoms in contact changes from frame to frame, so we store them
+    # per frame together with their count, the capacity is set on the first frame
+    # positions in MDAnalysis are single precision, so is everything stored per frame
+    liquid_contact_coords = np.empty((len(sampled_frames), 0, 2), dtype=np.float32)
+    liquid_contact_counts = np.empty(len(sampled_frames), dtype=int)
+    solid_coord1 = np.empty((len(sampled_frames), len(solid_atoms)), dtype=np.float32)
+    solid_coord2 = np.empty((len(sampled_frames), len(solid_atoms)), dtype=np.float32)
+
+    # buffers the liquid atoms in contact are projected into, at most all liquid atoms
+    liquid_contact_buffer1 = np.empty(len(liquid_atoms), dtype=np.float32)
+    liquid_contact_buffer2 = np.empty(len(liquid_atoms), dtype=np.float32)
+
+    # Loop over trajectory, the positions are read in blocks of frames
+    # and every step is done for all frames of a block at once
+    progress_bar = tqdm(total=len(sampled_frames))
+    for first_frame_of_block, positions_of_block in _read_positions_in_blocks_of_frames(
+        universe, sampled_frames, number_of_frames_per_block
+    ):
+        number_of_frames_in_block = len(positions_of_block)
 
-        # define center of mass of solid now
-        solid_COM = solid_atoms.center_of_mass()
+        # we start by making the frames translationally and rotationally invariant
+        # both are combined into a single affine transformation applied to all positions
+        # the positions are a copy of the frames, so they are modified in place
 
-        # now compute vector from liquid atoms from the center axis of the solid
-        vector_liquid_to_central_axis = liquid_atoms.positions - solid_COM
+        # 1. Translations
+        # This is done by computing the translation and substracting it
 
-        # only choose those atoms which are within contact layer from solid
-        liquid_atoms_in_contact_positions = vector_liquid_to_central_axis[
-            np.where(
-                np.linalg.norm(vector_liquid_to_central_axis[:, not_pbc_indices], axis=1)
-                >= spatial_extent_contact_layer
+        # solid, one translation per frame
+        translation_from_frame0 = (
+            utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+                positions_of_block[:, solid_indices], solid_masses, box[0:3], not_pbc_dimensions
             )
-        ]
-
-        # for chosen atoms compute position in periodic and angular direction
-        # periodic is easy
-        liquid_contact_coord2 = np.append(
-            liquid_contact_coord2,
-            liquid_atoms_in_contact_positions[:, pbc_indices] + solid_COM[pbc_indices],
+            - anchor_coordinates
         )
 
-        # the angular coordinate is a bit more tricky
-        # start by computing angle from axis
-        angles_liquid_contact_central_axis = np.arctan2(
-            liquid_atoms_in_contact_positions[:, not_pbc_indices[1]],
-            liquid_atoms_in_contact_positions[:, not_pbc_indices[0]],
-        )
+        # 2. Rotations (only relevant for nanotubes obviously)
+
+        # to enable an easy rotation, rotate around COM (after translation)
+        COM_before_translation = np.dot(all_masses, positions_of_block) / total_mass
+        COM = COM_before_translation - translation_from_frame0
 
-        # compute expansion on opened tube (adding pi to get only positive values)
-        angular_component_liquid_contact = (
-            tube_circumference * (angles_liquid_contact_central_axis + np.pi) / (2 * np.pi)
+        # prepare everything to compute angle between axis and anchor axis
+        # the translation cancels here, so the axis can be taken from the raw positions
+        solid_axis = (
+            np.mean(positions_of_block[:, anchor_rotation_atoms, not_pbc_indices], axis=1)
+            - COM_before_translation[:, not_pbc_indices]
         )
-        liquid_contact_coord1 = np.append(liquid_contact_coord1, angular_component_liquid_contact)
 
-        # do the same thing for solid
-        vector_solid_to_central_axis = solid_atoms.positions - solid_COM
-        solid_coord2 = np.append(solid_coord2, solid_atoms.positions[:, pbc_indices])
+        # Compute angle between reference atom and axis perpendicular to periodic axis
+        # the signed angle is needed to rotate the reference back onto this axis
+        angle_anchor_first_axis = -np.arctan2(solid_axis[:, 1], solid_axis[:, 0])
+
+        # frames in which the tube has not rotated, e.g. for rigid tubes, are not rotated
+        angle_anchor_first_axis[np.abs(angle_anchor_first_axis) <= 1e-6] = 0.0
+
+        # only rotate if the tube has rotated at all in this block
+        if np.any(angle_anchor_first_axis):
+
+            # the rotation axis is the periodic axis, so only the two non-periodic directions
+            # are rotated, counterclockwise in the plane spanned by them, one matrix per frame
+            # in single precision, otherwise the positions are upcast for the product
+            cos_angle = np.cos(angle_anchor_first_axis)
+            sin_angle = np.sin(angle_anchor_first_axis)
+            rotation_matrices = np.empty((number_of_frames_in_block, 2, 2), dtype=np.float32)
+            rotation_matrices[:, 0, 0] = cos_angle
+            rotation_matrices[:, 0, 1] = -sin_angle
+            rotation_matrices[:, 1, 0] = sin_angle
+            rotation_matrices[:, 1, 1] = cos_angle
+
+            # translating, moving to COM, rotating and moving back is
+            # R (x - t - COM) + COM = R x + (COM - R (t + COM))
+            # in periodic direction this leaves just the translation
+            rotation_offsets = COM[:, not_pbc_indices] - np.einsum(
+                "fij,fj->fi", rotation_matrices, COM_before_translation[:, not_pbc_indices]
+            )
+            positions_of_block[:, :, not_pbc_indices] = np.matmul(
+                positions_of_block[:, :, not_pbc_indices], rotation_matrices.transpose(0, 2, 1)
+            ) + rotation_offsets[:, np.newaxis, :].astype(np.float32)
+            positions_of_block[:, :, pbc_indices] -= translation_from_frame0[
+                :, np.newaxis, pbc_indices
+            ]
 
-        angles_solid_central_axis = np.arctan2(
-            vector_solid_to_central_axis[:, not_pbc_indices[1]],
-            vector_solid_to_central_axis[:, not_pbc_indices[0]],
-        )
+        else:
+            positions_of_block -= translation_from_frame0[:, np.newaxis, :]
 
-        angular_component_solid = (
-            tube_circumference * (angles_solid_central_axis + np.pi) / (2 * np.pi)
+        # wrap atoms in box, needed in any case as raw positions are usually not inside the box
+        positions_of_block = _wrap_positions_of_block_in_box(positions_of_block, box)
+
+        # define center of mass of solid now
+        solid_positions_of_block = positions_of_block[:, solid_indices]
+        liquid_positions_of_block = positions_of_block[:, liquid_indices]
+        solid_COM_of_block = utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+            solid_positions_of_block, solid_masses, box[0:3], not_pbc_dimensions
         )
 
-        solid_coord1 = np.append(solid_coord1, angular_component_solid)
+        # the projection on the opened tube is compiled already, so it is done frame by frame
+        for count_in_block in range(number_of_frames_in_block):
+            count_frames = first_frame_of_block + count_in_block
+            solid_COM = solid_COM_of_block[count_in_block]
+
+            # only choose those liquid atoms which are within contact layer from solid
+            # and compute their position in angular and periodic direction on the opened tube
+            number_of_liquid_atoms_in_contact = _project_atoms_on_opened_tube(
+                liquid_positions_of_block[count_in_block],
+                solid_COM,
+                not_pbc_indices[0],
+                not_pbc_indices[1],
+                pbc_indices[0],
+                spatial_extent_contact_layer ** 2,
+                angular_scale,
+                angular_offset,
+                liquid_contact_buffer1,
+                liquid_contact_buffer2,
+            )
+
+            liquid_contact_coords = _enlarge_liquid_contact_buffer_if_needed(
+                liquid_contact_coords, number_of_liquid_atoms_in_contact
+            )
+            liquid_contact_coords[
+                count_frames, :number_of_liquid_atoms_in_contact, 0
+            ] = liquid_contact_buffer1[:number_of_liquid_atoms_in_contact]
+            liquid_contact_coords[
+                count_frames, :number_of_liquid_atoms_in_contact, 1
+            ] = liquid_contact_buffer2[:number_of_liquid_atoms_in_contact]
+            liquid_contact_counts[count_frames] = number_of_liquid_atoms_in_contact
+
+            # do the same thing for solid, here all atoms are projected
+            _project_atoms_on_opened_tube(
+                solid_positions_of_block[count_in_block],
+                solid_COM,
+                not_pbc_indices[0],
+                not_pbc_indices[1],
+                pbc_indices[0],
+                0.0,
+                angular_scale,
+                angular_offset,
+                solid_coord1[count_frames],
+                solid_coord2[count_frames],
+            )
 
-        # making code more efficient, ugly bu useful
-        if count_frames % 1000 == 0 or count_frames == number_of_samples - 1:
+        progress_bar.update(number_of_frames_in_block)
+    progress_bar.close()
 
-            # save full arrays to global array and empty local to free memory and speed up loop
-            liquid_contact_coord1_all = np.append(liquid_contact_coord1_all, liquid_contact_coord1)
-            liquid_contact_coord1 = []
-            liquid_contact_coord2_all = np.append(liquid_contact_coord2_all, liquid_contact_coord2)
-            liquid_contact_coord2 = []
-            solid_coord1_all = np.append(solid_coord1_all, solid_coord1)
-            solid_coord1 = []
-            solid_coord2_all = np.append(solid_coord2_all, solid_coord2)
-            solid_coord2 = []
+    # stack everything, only the results are returned in double precision
+    liquid_contact_2d = _gather_liquid_contact_coordinates(
+        liquid_contact_coords, liquid_contact_counts
+    ).astype(np.float64)
 
-    # stack everything
-    liquid_contact_2d = np.column_stack((liquid_contact_coord1_all, liquid_contact_coord2_all))
-    solid_2d = np.column_stack((solid_coord1_all, solid_coord2_all))
+    solid_2d = np.column_stack((solid_coord1.flatten(), solid_coord2.flatten()))
 
     return liquid_contact_2d, solid_2d
 
@@ -555,6 +669,8 @@ def _compute_distribution_for_system_with_two_periodic_directions(
     start_frame: int,
     end_frame: int,
     frame_frequency: int,
+    n_cores: int = 1,
+    number_of_frames_per_block: int = 256,
 ):
     """
     Compute distribution of atomic positions for 2D systems.
@@ -566,6 +682,8 @@ def _compute_distribution_for_system_with_two_periodic_directions(
         start_frame (int) : Start frame for analysis.
         end_frame (int) : End frame for analysis.
         frame_frequency (int): Take every nth frame only.
+        n_cores (int): Number of processes the frames are distributed over.
+        number_of_frames_per_block (int): Number of frames read and processed at once.
     Returns:
         liquid_contact_2D: numpy array with positions in periodic directions of
                             oxygens in contact layer
@@ -575,88 +693,334 @@ def _compute_distribution_for_system_with_two_periodic_directions(
     """
 
     # define dimensions not periodic, indices
-    not_pbc_indices = list(set(pbc_indices) ^ set([0, 1, 2]))
-    periodic_vector = np.zeros(3)
-    periodic_vector[pbc_indices] = 1
-
-    # wrap atoms in box
-    # universe.atoms.pack_into_box(box=topology.get_cell_lengths_and_angles(), inplace=True)
+    not_pbc_indices = sorted(set([0, 1, 2]) - set(pbc_indices))
 
     # start by separating solid atoms from liquid atoms
     solid_atoms = universe.select_atoms("not name O H")
 
-    # approximate water with oxygens here
-    liquid_atoms = universe.select_atoms("name O")
+    # cell does not change along the trajectory
+    box = topology.get_cell_lengths_and_angles()
 
     # this will serve as our anchor for computing the free energy profile
-    anchor_coordinates = solid_atoms.center_of_mass()
+    # the solid might be split by the boundaries of the box in the non-periodic direction
+    anchor_coordinates = utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+        solid_atoms.positions,
+        solid_atoms.masses,
+        box[0:3],
+        "".join("xyz"[index] for index in not_pbc_indices),
+    )
 
-    # define arrays where the coordinates of oxygens and solid atoms will be saved in
-    liquid_contact_coord1 = []
-    liquid_contact_coord2 = []
-    solid_all = []
+    # frames which will be analysed
+    sampled_frames = np.arange(universe.trajectory.n_frames)[start_frame:end_frame][
+        ::frame_frequency
+    ]
+
+    return _distribute_frames_over_cores(
+        _compute_distribution_for_frames_with_two_periodic_directions,
+        universe,
+        sampled_frames,
+        n_cores,
+        box=box,
+        spatial_extent_contact_layer=spatial_extent_contact_layer,
+        pbc_indices=pbc_indices,
+        anchor_coordinates=anchor_coordinates,
+        number_of_frames_per_block=number_of_frames_per_block,
+    )
 
-    liquid_contact_coord1_all = []
-    liquid_contact_coord2_all = []
-    solid_all_all = []
 
-    number_of_samples = len(np.arange(start_frame, end_frame, frame_frequency))
+def _compute_distribution_for_frames_with_two_periodic_directions(
+    universe,
+    sampled_frames,
+    box,
+    spatial_extent_contact_layer: float,
+    pbc_indices,
+    anchor_coordinates,
+    number_of_frames_per_block: int = 256,
+):
+    """
+    Compute distribution of atomic positions for 2D systems for the given frames.
+    Arguments:
+        universe : MDAnalysis universe to be analysed.
+        sampled_frames : Indices of the frames which will be analysed.
+        box : Cell lengths and angles of the system.
+        spatial_extent_contact_layer (float): How far ranges the water contact layer.
+        pbc_indices : Direction indices in which system is periodic
+        anchor_coordinates : Center of mass of the solid all frames are translated to.
+        number_of_frames_per_block (int): Number of frames read and processed at once.
+    Returns:
+        liquid_contact_2D: numpy array with positions in periodic directions of
+                            oxygens in contact layer
+        solid_all: numpy array of all solid atom positions in periodic directions
+                     structured by timestep
+
+    """
 
-    # Loop over trajectory
-    for count_frames, frames in enumerate(
-        tqdm((universe.trajectory[start_frame:end_frame])[::frame_frequency])
+    # define dimensions not periodic, indices
+    not_pbc_indices = sorted(set([0, 1, 2]) - set(pbc_indices))
+
+    # directions in which the solid might be split by the boundaries of the box
+    not_pbc_dimensions = "".join("xyz"[index] for index in not_pbc_indices)
+
+    # convert index lists to arrays once, they are used for fancy indexing in every frame
+    pbc_indices = np.asarray(pbc_indices)
+    not_pbc_indices = np.asarray(not_pbc_indices)
+
+    # wrap atoms in box
+    # universe.atoms.pack_into_box(box=box, inplace=True)
+
+    # start by separating solid atoms from liquid atoms
+    solid_atoms = universe.select_atoms("not name O H")
+
+    # approximate water with oxygens here
+    liquid_atoms = universe.select_atoms("name O")
+
+    # masses do not change either, store them to compute centers of mass in the loop
+    solid_indices = solid_atoms.ix
+    liquid_indices = liquid_atoms.ix
+    solid_masses = solid_atoms.masses
+
+    # define containers where the coordinates of oxygens and solid atoms will be saved in
+    # the number of liquid atoms in contact changes from frame to frame, so we store them
+    # per frame together with their count, the capacity is set on the first frame
+    # positions in MDAnalysis are single precision, so is everything stored per frame
+    liquid_contact_coords = np.empty((len(sampled_frames), 0, 2), dtype=np.float32)
+    liquid_contact_counts = np.empty(len(sampled_frames), dtype=int)
+    solid_all = np.empty((len(sampled_frames), len(solid_atoms), 3), dtype=np.float32)
+
+    # Loop over trajectory, the positions are read in blocks of frames
+    # and every step is done for all frames of a block at once
+    progress_bar = tqdm(total=len(sampled_frames))
+    for first_frame_of_block, positions_of_block in _read_positions_in_blocks_of_frames(
+        universe, sampled_frames, number_of_frames_per_block
     ):
-        # wrap atoms in box
-        # universe.atoms.pack_into_box(box=topology.get_cell_lengths_and_angles(), inplace=True)
+        number_of_frames_in_block = len(positions_of_block)
+        frames_of_block = slice(
+            first_frame_of_block, first_frame_of_block + number_of_frames_in_block
+        )
 
         # we start by making the frames translationally invariant
         # This is done by computing the translation and substracting it
-        translation_from_frame0 = solid_atoms.center_of_mass() - anchor_coordinates
-        universe.atoms.positions -= translation_from_frame0
+        # the positions are a copy of the frames, so they are modified in place
+        translation_from_frame0 = (
+            utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+                positions_of_block[:, solid_indices], solid_masses, box[0:3], not_pbc_dimensions
+            )
+            - anchor_coordinates
+        )
+        positions_of_block -= translation_from_frame0[:, np.newaxis, :]
 
         # wrap atoms in box
-        universe.atoms.pack_into_box(box=topology.get_cell_lengths_and_angles(), inplace=True)
+        positions_of_block = _wrap_positions_of_block_in_box(positions_of_block, box)
 
         # define center of mass of solid now
-        solid_COM = solid_atoms.center_of_mass()
-
-        # now compute distance from liquid atoms perpendicular to the center of mass of the solid
-        perpendicular_distance_liquid_to_solid = (
-            liquid_atoms.positions[:, not_pbc_indices] - solid_COM[not_pbc_indices]
-        ).flatten()
+        solid_positions_of_block = positions_of_block[:, solid_indices]
+        solid_COM = utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+            solid_positions_of_block, solid_masses, box[0:3], not_pbc_dimensions
+        )
 
-        # only choose those atoms which are within contact layer only 2D
-        liquid_atoms_in_contact_positions = liquid_atoms[
-            np.where(perpendicular_distance_liquid_to_solid <= spatial_extent_contact_layer)
-        ].positions[:, pbc_indices]
+        # now compute vector from liquid atoms perpendicular to the center of mass of the solid
+        # keep it in the single precision of the positions instead of upcasting all atoms
+        liquid_positions_of_block = positions_of_block[:, liquid_indices]
+        solid_COM_not_pbc = solid_COM[:, not_pbc_indices].astype(np.float32)
+        perpendicular_vector_liquid_to_solid = (
+            liquid_positions_of_block[:, :, not_pbc_indices] - solid_COM_not_pbc[:, np.newaxis, :]
+        )
 
-        # save liquid
-        liquid_contact_coord1 = np.append(
-            liquid_contact_coord1, liquid_atoms_in_contact_positions[:, pbc_indices[0]]
+        # only choose those atoms which are within contact layer on either side of the solid
+        # compare squared distances per atom to avoid the square root
+        liquid_atoms_in_contact = (
+            np.sum(perpendicular_vector_liquid_to_solid ** 2, axis=2)
+            <= spatial_extent_contact_layer ** 2
         )
+        liquid_atoms_in_contact_positions = liquid_positions_of_block[liquid_atoms_in_contact][
+            :, pbc_indices
+        ]
 
-        liquid_contact_coord2 = np.append(
-            liquid_contact_coord2, liquid_atoms_in_contact_positions[:, pbc_indices[1]]
+        # save liquid, the atoms in contact are ordered by frame, so they fill
+        # the first entries of each frame in the same order
+        number_of_liquid_atoms_in_contact = np.sum(liquid_atoms_in_contact, axis=1)
+        liquid_contact_coords = _enlarge_liquid_contact_buffer_if_needed(
+            liquid_contact_coords, np.max(number_of_liquid_atoms_in_contact)
+        )
+        filled_entries = (
+            np.arange(liquid_contact_coords.shape[1])
+            < number_of_liquid_atoms_in_contact[:, np.newaxis]
         )
+        liquid_contact_coords[frames_of_block][filled_entries] = liquid_atoms_in_contact_positions
+        liquid_contact_counts[frames_of_block] = number_of_liquid_atoms_in_contact
 
         # save solid
-        solid_all = np.append(solid_all, solid_atoms.positions)
+        solid_all[frames_of_block] = solid_positions_of_block
+
+        progress_bar.update(number_of_frames_in_block)
+    progress_bar.close()
+
+    # put coords of liquid together, only the results are returned in double precision
+    liquid_contact_2d = _gather_liquid_contact_coordinates(
+        liquid_contact_coords, liquid_contact_counts
+    )
+
+    return liquid_contact_2d.astype(np.float64), solid_all.flatten().astype(np.float64)
+
+
+def _distribute_frames_over_cores(
+    compute_distribution_for_frames, universe, sampled_frames, n_cores: int, **kwargs
+):
+    """
+    Run a distribution function on the sampled frames, split over several processes if asked.
+    Every process analyses a contiguous block of frames on its own copy of the universe,
+    the results are put back together in the order of the frames.
+    Arguments:
+        compute_distribution_for_frames : Function analysing a set of frames of a universe.
+        universe : MDAnalysis universe to be analysed.
+        sampled_frames : Indices of the frames which will be analysed.
+        n_cores (int): Number of processes the frames are distributed over.
+        kwargs : Further arguments passed to compute_distribution_for_frames.
+    Returns:
+        Concatenated results of compute_distribution_for_frames.
+    """
+
+    if n_cores < 1:
+        raise analysis.UnphysicalValue(
+            f" You want to distribute the frames over {n_cores} processes."
+            f" Please use at least one process."
+        )
+
+    if n_cores == 1:
+        return compute_distribution_for_frames(universe, sampled_frames, **kwargs)
+
+    # one contiguous block of frames per process, universes are copied once per block
+    blocks_of_frames = [
+        block for block in np.array_split(sampled_frames, n_cores) if len(block) > 0
+    ]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_cores) as executor:
+        results_per_block = list(
+            executor.map(
+                functools.partial(compute_distribution_for_frames, **kwargs),
+                [universe] * len(blocks_of_frames),
+                blocks_of_frames,
+            )
+        )
+
+    return tuple(np.concatenate(results) for results in zip(*results_per_block))
+
+
+def _read_positions_in_blocks_of_frames(
+    universe, sampled_frames, number_of_frames_per_block: int = 256
+):
+    """
+    Read the positions of all atoms for the sampled frames, one block of frames at a time.
+    The positions are copied into one array per block, so they can be modified
+    without changing the universe.
+    Arguments:
+        universe : MDAnalysis universe to be read.
+        sampled_frames : Indices of the frames which will be read.
+        number_of_frames_per_block (int): Maximum number of frames read at once.
+    Returns:
+        Generator of the position of the first frame of a block in sampled_frames
+        and the positions of the block as array of shape (frames, atoms, 3).
+    """
+
+    for first_frame_of_block in range(0, len(sampled_frames), number_of_frames_per_block):
+        frames_of_block = np.asarray(
+            sampled_frames[first_frame_of_block : first_frame_of_block + number_of_frames_per_block]
+        )
+
+        # equally spaced frames are read with a single call, e.g. DCD files at once
+        # readers without timeseries (MDAnalysis < 2.4) are read frame by frame
+        frame_step = frames_of_block[1] - frames_of_block[0] if len(frames_of_block) > 1 else 1
+
+        if (
+            hasattr(universe.trajectory, "timeseries")
+            and frame_step > 0
+            and np.all(np.diff(frames_of_block) == frame_step)
+        ):
+            # in-memory trajectories include stop and return a view of the stored coordinates,
+            # so only the requested frames are kept and always copied
+            positions_of_block = np.array(
+                universe.trajectory.timeseries(
+                    start=frames_of_block[0],
+                    stop=frames_of_block[-1] + 1,
+                    step=frame_step,
+                    order="fac",
+                )[: len(frames_of_block)],
+                dtype=np.float32,
+                copy=True,
+            )
+
+        else:
+            positions_of_block = np.empty(
+                (len(frames_of_block), universe.atoms.n_atoms, 3), dtype=np.float32
+            )
+            for count_frames, __ in enumerate(universe.trajectory[frames_of_block]):
+                positions_of_block[count_frames] = universe.trajectory.ts.positions
+
+        yield first_frame_of_block, positions_of_block
+
+
+def _wrap_positions_of_block_in_box(positions_of_block, box):
+    """
+    Wrap the positions of all atoms of several frames into the same box.
+    Arguments:
+        positions_of_block : Positions of shape (frames, atoms, 3).
+        box : Cell lengths and angles of the system.
+    Returns:
+        positions_of_block : Wrapped positions of shape (frames, atoms, 3).
+    """
 
-        # making code more efficient, ugly but useful
-        if count_frames % 1000 == 0 or count_frames == number_of_samples - 1:
+    # the box is the same for all frames, so all positions are wrapped in one call
+    return mdanalysis_distances.apply_PBC(positions_of_block.reshape(-1, 3), box).reshape(
+        positions_of_block.shape
+    )
 
-            # save full arrays to global array and empty local to free memory and speed up loop
-            liquid_contact_coord1_all = np.append(liquid_contact_coord1_all, liquid_contact_coord1)
-            liquid_contact_coord1 = []
-            liquid_contact_coord2_all = np.append(liquid_contact_coord2_all, liquid_contact_coord2)
-            liquid_contact_coord2 = []
-            solid_all_all = np.append(solid_all_all, solid_all)
-            solid_all = []
 
-    # put coords of liquid together
-    liquid_contact_2d = np.column_stack((liquid_contact_coord1_all, liquid_contact_coord2_all))
+def _enlarge_liquid_contact_buffer_if_needed(
+    liquid_contact_coords, number_of_liquid_atoms_in_contact: int
+):
+    """
+    Make sure the per-frame buffer of liquid atoms in contact can hold a given number of atoms.
+    The capacity is set with some headroom, so that it is rarely enlarged more than once.
+    Arguments:
+        liquid_contact_coords : Array of shape (frames, capacity, 2) with coordinates per frame.
+        number_of_liquid_atoms_in_contact (int): Number of atoms which need to fit in one frame.
+    Returns:
+        liquid_contact_coords : The same array or an enlarged copy of it.
+    """
 
-    return liquid_contact_2d, (solid_all_all)
+    if number_of_liquid_atoms_in_contact <= liquid_contact_coords.shape[1]:
+        return liquid_contact_coords
+
+    # the number of atoms in contact fluctuates only slightly in an equilibrated system
+    enlarged_liquid_contact_coords = np.empty(
+        (
+            liquid_contact_coords.shape[0],
+            int(1.5 * number_of_liquid_atoms_in_contact) + 16,
+            liquid_contact_coords.shape[2],
+        ),
+        dtype=liquid_contact_coords.dtype,
+    )
+    enlarged_liquid_contact_coords[:, : liquid_contact_coords.shape[1]] = liquid_contact_coords
+
+    return enlarged_liquid_contact_coords
+
+
+def _gather_liquid_contact_coordinates(liquid_contact_coords, liquid_contact_counts):
+    """
+    Put the coordinates of liquid atoms in contact of all frames in one array.
+    Arguments:
+        liquid_contact_coords : Array of shape (frames, capacity, 2) with coordinates per frame.
+        liquid_contact_counts : Number of valid atoms in each frame.
+    Returns:
+        liquid_contact_2d : Array of shape (atoms in contact of all frames, 2).
+    """
+
+    # only the first entries of each frame are filled
+    filled_entries = (
+        np.arange(liquid_contact_coords.shape[1]) < liquid_contact_counts[:, np.newaxis]
+    )
+
+    return liquid_contact_coords[filled_entries]
 
 
 def _get_atom_ids_on_same_tube_axis(solid_atoms, tube_length_in_unit_cells: int, not_pbc_indices):
@@ -671,13 +1035,77 @@ def _get_atom_ids_on_same_tube_axis(solid_atoms, tube_length_in_unit_cells: int,
 
     """
 
-    # for atom 0 get all indices of atoms which have similar coordinates in the non-pbc directions
-    ids_candidate_atoms_on_axis_with_0 = np.argsort(
-        np.linalg.norm(
-            solid_atoms.positions[:, not_pbc_indices] - solid_atoms.positions[0][not_pbc_indices],
-            axis=1,
+    # number of atoms expected on the same axis based on tube length
+    number_of_atoms_on_axis = min(2 * tube_length_in_unit_cells, len(solid_atoms))
+
+    # for atom 0 get squared distances to all atoms in the non-pbc directions
+    # squared distances give the same ordering without taking the square root
+    positions = solid_atoms.positions[:, not_pbc_indices]
+    squared_distances_to_0 = np.sum((positions - positions[0]) ** 2, axis=1)
+
+    # only the closest atoms are needed, so partition instead of sorting all atoms
+    ids_candidate_atoms_on_axis_with_0 = np.argpartition(
+        squared_distances_to_0, number_of_atoms_on_axis - 1
+    )[:number_of_atoms_on_axis]
+
+    # return indices closest based on tube length, sorted by distance
+    return ids_candidate_atoms_on_axis_with_0[
+        np.argsort(squared_distances_to_0[ids_candidate_atoms_on_axis_with_0])
+    ]
+
+
+@numba.njit(cache=True, fastmath=True)
+def _project_atoms_on_opened_tube(
+    positions,
+    tube_center,
+    first_not_pbc_index: int,
+    second_not_pbc_index: int,
+    pbc_index: int,
+    minimum_radial_distance_squared: float,
+    angular_scale: float,
+    angular_offset: float,
+    angular_coordinates,
+    periodic_coordinates,
+):
+    """
+    Project atoms onto the opened (unrolled) surface of a tube.
+    Only atoms whose radial distance from the tube axis is at least the given
+    minimum are projected, they are written consecutively to the output arrays.
+    Arguments:
+        positions: Atomic positions of shape (number of atoms, 3).
+        tube_center: Point on the tube axis, e.g. the center of mass of the tube.
+        first_not_pbc_index (int): First direction perpendicular to the tube axis, angles are
+                                   measured from this direction towards the second one.
+        second_not_pbc_index (int): Second direction perpendicular to the tube axis.
+        pbc_index (int): Periodic direction, i.e. along the tube axis.
+        minimum_radial_distance_squared (float): Squared radial distance from which on atoms are projected.
+        angular_scale (float): Tube radius in A, converts angles to lengths on the opened tube.
+        angular_offset (float): Shift making angular coordinates positive, i.e. pi * angular_scale.
+        angular_coordinates: Output array for the coordinates in angular direction.
+        periodic_coordinates: Output array for the coordinates in periodic direction.
+    Returns:
+        number_of_projected_atoms (int): Number of atoms written to the output arrays.
+    """
+
+    number_of_projected_atoms = 0
+
+    for atom in range(positions.shape[0]):
+
+        # vector from the tube axis perpendicular to it
+        radial_component1 = positions[atom, first_not_pbc_index] - tube_center[first_not_pbc_index]
+        radial_component2 = (
+            positions[atom, second_not_pbc_index] - tube_center[second_not_pbc_index]
         )
-    )
 
-    # return indices closest based on tube length
-    return ids_candidate_atoms_on_axis_with_0[0 : 2 * tube_length_in_unit_cells]
+        if radial_component1 ** 2 + radial_component2 ** 2 < minimum_radial_distance_squared:
+            continue
+
+        # compute expansion on opened tube
+        angular_coordinates[number_of_projected_atoms] = (
+            np.arctan2(radial_component2, radial_component1) * angular_scale + angular_offset
+        )
+        periodic_coordinates[number_of_projected_atoms] = positions[atom, pbc_index]
+
+        number_of_projected_atoms += 1
+
+    return number_of_projected_atoms
@@ -258,6 +258,64 @@ def get_center_of_mass_of_atoms_in_accordance_with_MIC(
     return com_MIC_in_box
 
 
+def get_pseudo_center_of_mass_in_accordance_with_pbc(
+    positions: np.array,
+    masses: np.array,
+    cell_lengths: np.array,
+    dimension: str = "xyz",
+):
+    """
+    Return center of mass of atoms which might be split by the periodic boundaries.
+    In the given dimensions coordinates are mapped onto a circle of the box length and
+    averaged there to obtain a pseudo center of mass. The atoms are then wrapped into the
+    box centered at this point and their ordinary center of mass is computed, so that the
+    result does not depend on where atoms were wrapped. Other directions use the ordinary
+    center of mass. Currently, only implemented for orthorombic cells.
+    Arguments:
+        positions (np.array): Positions of the atoms, or of the atoms in several frames
+                              with shape (frames, atoms, 3).
+        masses (np.array): Masses of the atoms.
+        cell_lengths (np.array): Lengths of the simulation box.
+        dimension (str) : Directions in which atoms might be split by the periodic boundaries.
+    Returns:
+        center_of_mass_pbc (np.array): Center of mass in accordance with pbc, one per frame.
+    """
+
+    if not global_variables.DIMENSION_DICTIONARY.get(dimension):
+        raise UndefinedOption(
+            f"Specified dimension {dimension} is unknown. Possible options are {global_variables.DIMENSION_DICTIONARY.keys()}"
+        )
+
+    dimension_indices = global_variables.DIMENSION_DICTIONARY.get(dimension)
+    cell_lengths = np.asarray(cell_lengths)[dimension_indices]
+    total_mass = np.sum(masses)
+
+    # ordinary center of mass
+    center_of_mass_pbc = np.dot(masses, positions) / total_mass
+
+    # map coordinates in periodic directions onto a circle and average there
+    angles = 2 * np.pi * positions[..., dimension_indices] / cell_lengths
+    mean_cos = np.dot(masses, np.cos(angles)) / total_mass
+    mean_sin = np.dot(masses, np.sin(angles)) / total_mass
+
+    # map mean angle back into the box to get pseudo center of mass
+    pseudo_center_of_mass = cell_lengths * (np.arctan2(-mean_sin, -mean_cos) + np.pi) / (2 * np.pi)
+
+    # shift pseudo center of mass to center of box, wrap atoms and compute center of mass there
+    shift = 0.5 * cell_lengths - pseudo_center_of_mass
+    positions_shifted = np.mod(
+        positions[..., dimension_indices] + shift[..., np.newaxis, :], cell_lengths
+    )
+    center_of_mass_shifted = np.dot(masses, positions_shifted) / total_mass
+
+    # shift back and wrap inside box
+    center_of_mass_pbc[..., dimension_indices] = np.mod(
+        center_of_mass_shifted - shift, cell_lengths
+    )
+
+    return center_of_mass_pbc
+
+
 def compute_diffusion_coefficient_based_on_MSD(
     measured_msd: np.array,
     measured_time: np.array,
@@ -8,5 +8,5 @@ setup(
     author_email="flt17@imperial.ac.uk",
     description="Analysis code to evaluate the structural and dynamical behaviour of confined water",
     packages=find_packages(),
-    install_requires=["numpy", "scipy", "MDAnalysis", "ase", "findpeaks"],
+    install_requires=["numpy", "numba", "scipy", "MDAnalysis", "ase", "findpeaks"],
 )
@@ -433,3 +433,34 @@ class TestSimulation_GetWaterContactLayerOnInterface:
         spatial_expansion_contact_layer = simulation.get_water_contact_layer_on_interface()
 
         assert spatial_expansion_contact_layer > 0
+
+
+class TestSimulation_ComputeFreeEnergyProfile:
+    def test_returns_same_distribution_on_multiple_cores(self):
+        path = "./files/water_on_graphene"
+
+        simulation = analysis.Simulation(path)
+
+        simulation.read_in_simulation_data(read_positions=True)
+
+        simulation.set_pbc_dimensions("xy")
+
+        simulation.set_sampling_times(
+            start_time=0, end_time=-1, frame_frequency=1, time_between_frames=20
+        )
+
+        simulation.compute_density_profile(["O", "H"], direction="z")
+
+        simulation.compute_free_energy_profile()
+        distribution_liquid_serial = simulation.free_energy_profile.distribution_liquid
+        distribution_solid_serial = simulation.free_energy_profile.distribution_solid
+
+        simulation.compute_free_energy_profile(n_cores=2)
+
+        np.testing.assert_array_equal(
+            simulation.free_energy_profile.distribution_liquid, distribution_liquid_serial
+        )
+        for element, distribution_solid in distribution_solid_serial.items():
+            np.testing.assert_array_equal(
+                simulation.free_energy_profile.distribution_solid[element], distribution_solid
+            )
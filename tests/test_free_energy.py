@@ -1,3 +1,6 @@
+import MDAnalysis as mdanalysis
+import numpy as np
+import pytest
 import sys
 
 sys.path.append("../")
@@ -67,3 +70,345 @@ class TestComputeAtomicProbabilities:
             end_frame=100,
             frame_frequency=1,
         )
+
+    def test_returns_same_distribution_on_multiple_cores(self):
+        path = "./files/water_on_graphene"
+
+        simulation = analysis.Simulation(path)
+        simulation.read_in_simulation_data(read_positions=True)
+
+        simulation.set_sampling_times(
+            start_time=0, end_time=-1, frame_frequency=1, time_between_frames=20
+        )
+
+        simulation.set_pbc_dimensions(pbc_dimensions="xy")
+        pbc_indices = global_variables.DIMENSION_DICTIONARY.get(simulation.pbc_dimensions)
+
+        simulation.compute_density_profile(["O", "H"], direction="z")
+
+        spatial_expansion_contact_layer = simulation.get_water_contact_layer_on_interface()
+
+        distribution_serial = free_energy.compute_spatial_distribution_of_atoms_on_interface(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            pbc_indices,
+            start_frame=0,
+            end_frame=100,
+            frame_frequency=3,
+        )
+        liquid_serial, solid_serial = distribution_serial
+
+        distribution_parallel = free_energy.compute_spatial_distribution_of_atoms_on_interface(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            pbc_indices,
+            start_frame=0,
+            end_frame=100,
+            frame_frequency=3,
+            n_cores=2,
+        )
+        liquid_parallel, solid_parallel = distribution_parallel
+
+        np.testing.assert_array_equal(liquid_serial, liquid_parallel)
+        for element in solid_serial:
+            np.testing.assert_array_equal(solid_serial[element], solid_parallel[element])
+
+
+class TestComputeDistributionForSystemWithOnePeriodicDirection:
+    def test_returns_same_distribution_on_multiple_cores(self):
+        path = "./files/water_in_carbon_nanotube/m12_n12/classical"
+
+        simulation = analysis.Simulation(path)
+
+        simulation.read_in_simulation_data(read_positions=True)
+        simulation.set_sampling_times(
+            start_time=0, end_time=-1, frame_frequency=1, time_between_frames=20
+        )
+
+        simulation.set_pbc_dimensions(pbc_dimensions="z")
+        pbc_indices = global_variables.DIMENSION_DICTIONARY.get(simulation.pbc_dimensions)
+
+        simulation.compute_density_profile(["O", "H"], direction="radial z")
+
+        spatial_expansion_contact_layer = simulation.get_water_contact_layer_on_interface()
+
+        tube_radius = simulation.compute_tube_radius(pbc_indices)
+
+        compute_distribution = (
+            free_energy._compute_distribution_for_system_with_one_periodic_direction
+        )
+
+        liquid_serial, solid_serial = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            tube_radius,
+            6,
+            pbc_indices,
+            0,
+            100,
+            3,
+        )
+
+        liquid_parallel, solid_parallel = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            tube_radius,
+            6,
+            pbc_indices,
+            0,
+            100,
+            3,
+            n_cores=2,
+        )
+
+        np.testing.assert_array_equal(liquid_serial, liquid_parallel)
+        np.testing.assert_array_equal(solid_serial, solid_parallel)
+
+    def test_returns_same_distribution_for_in_memory_universe_without_changing_it(self):
+        path = "./files/water_in_carbon_nanotube/m12_n12/classical"
+
+        simulation = analysis.Simulation(path)
+
+        simulation.read_in_simulation_data(read_positions=True)
+        simulation.set_sampling_times(
+            start_time=0, end_time=-1, frame_frequency=1, time_between_frames=20
+        )
+
+        simulation.set_pbc_dimensions(pbc_dimensions="z")
+        pbc_indices = global_variables.DIMENSION_DICTIONARY.get(simulation.pbc_dimensions)
+
+        simulation.compute_density_profile(["O", "H"], direction="radial z")
+
+        spatial_expansion_contact_layer = simulation.get_water_contact_layer_on_interface()
+
+        tube_radius = simulation.compute_tube_radius(pbc_indices)
+
+        compute_distribution = (
+            free_energy._compute_distribution_for_system_with_one_periodic_direction
+        )
+
+        # end before the last frame, so that reading one frame too many would be noticed
+        liquid_from_file, solid_from_file = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            tube_radius,
+            6,
+            pbc_indices,
+            0,
+            50,
+            1,
+        )
+
+        simulation.position_universes[0].transfer_to_memory()
+        coordinates_in_memory = simulation.position_universes[0].trajectory.coordinate_array.copy()
+
+        liquid_in_memory, solid_in_memory = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            tube_radius,
+            6,
+            pbc_indices,
+            0,
+            50,
+            1,
+        )
+
+        np.testing.assert_array_equal(liquid_from_file, liquid_in_memory)
+        np.testing.assert_array_equal(solid_from_file, solid_in_memory)
+        np.testing.assert_array_equal(
+            simulation.position_universes[0].trajectory.coordinate_array, coordinates_in_memory
+        )
+
+    def test_returns_same_distribution_for_small_blocks_of_frames(self):
+        path = "./files/water_in_carbon_nanotube/m12_n12/classical"
+
+        simulation = analysis.Simulation(path)
+
+        simulation.read_in_simulation_data(read_positions=True)
+        simulation.set_sampling_times(
+            start_time=0, end_time=-1, frame_frequency=1, time_between_frames=20
+        )
+
+        simulation.set_pbc_dimensions(pbc_dimensions="z")
+        pbc_indices = global_variables.DIMENSION_DICTIONARY.get(simulation.pbc_dimensions)
+
+        simulation.compute_density_profile(["O", "H"], direction="radial z")
+
+        spatial_expansion_contact_layer = simulation.get_water_contact_layer_on_interface()
+
+        tube_radius = simulation.compute_tube_radius(pbc_indices)
+
+        compute_distribution = (
+            free_energy._compute_distribution_for_system_with_one_periodic_direction
+        )
+
+        liquid_one_block, solid_one_block = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            tube_radius,
+            6,
+            pbc_indices,
+            0,
+            100,
+            1,
+        )
+
+        # several blocks, the last one only partially filled
+        liquid_small_blocks, solid_small_blocks = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            tube_radius,
+            6,
+            pbc_indices,
+            0,
+            100,
+            1,
+            number_of_frames_per_block=7,
+        )
+
+        np.testing.assert_array_equal(liquid_one_block, liquid_small_blocks)
+        np.testing.assert_array_equal(solid_one_block, solid_small_blocks)
+
+
+class TestComputeDistributionForSystemWithTwoPeriodicDirections:
+    def test_returns_same_distribution_for_small_blocks_of_frames(self):
+        path = "./files/water_on_graphene"
+
+        simulation = analysis.Simulation(path)
+        simulation.read_in_simulation_data(read_positions=True)
+
+        simulation.set_sampling_times(
+            start_time=0, end_time=-1, frame_frequency=1, time_between_frames=20
+        )
+
+        simulation.set_pbc_dimensions(pbc_dimensions="xy")
+        pbc_indices = global_variables.DIMENSION_DICTIONARY.get(simulation.pbc_dimensions)
+
+        simulation.compute_density_profile(["O", "H"], direction="z")
+
+        spatial_expansion_contact_layer = simulation.get_water_contact_layer_on_interface()
+
+        compute_distribution = (
+            free_energy._compute_distribution_for_system_with_two_periodic_directions
+        )
+
+        liquid_one_block, solid_one_block = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            pbc_indices,
+            0,
+            100,
+            1,
+        )
+
+        # several blocks, the last one only partially filled
+        liquid_small_blocks, solid_small_blocks = compute_distribution(
+            simulation.position_universes[0],
+            simulation.topology,
+            spatial_expansion_contact_layer,
+            pbc_indices,
+            0,
+            100,
+            1,
+            number_of_frames_per_block=7,
+        )
+
+        np.testing.assert_array_equal(liquid_one_block, liquid_small_blocks)
+        np.testing.assert_array_equal(solid_one_block, solid_small_blocks)
+
+
+class TestDistributeFramesOverCores:
+    def test_raises_error_when_no_cores_are_requested(self):
+        path = "./files/water_on_graphene"
+
+        simulation = analysis.Simulation(path)
+        simulation.read_in_simulation_data(read_positions=True)
+
+        with pytest.raises(analysis.UnphysicalValue):
+            free_energy._distribute_frames_over_cores(
+                free_energy._compute_distribution_for_frames_with_two_periodic_directions,
+                simulation.position_universes[0],
+                np.arange(10),
+                n_cores=0,
+            )
+
+
+class TestComputeDistributionForFramesWithTwoPeriodicDirections:
+    def test_returns_liquid_atoms_within_contact_layer_on_either_side_of_sheet(self):
+        # two carbon atoms forming a sheet at z = 10, oxygens above and below it
+        # within the contact layer and far away from it on both sides
+        positions = np.array(
+            [
+                [5.0, 5.0, 10.0],
+                [15.0, 15.0, 10.0],
+                [1.0, 2.0, 12.0],
+                [3.0, 4.0, 8.0],
+                [5.0, 6.0, 2.0],
+                [7.0, 8.0, 20.0],
+            ]
+        )
+        box = np.array([20.0, 20.0, 30.0, 90.0, 90.0, 90.0])
+
+        universe = mdanalysis.Universe.empty(len(positions), trajectory=True)
+        universe.add_TopologyAttr("names", ["C", "C", "O", "O", "O", "O"])
+        universe.add_TopologyAttr("masses", [12.011, 12.011, 15.999, 15.999, 15.999, 15.999])
+        universe.atoms.positions = positions
+        universe.dimensions = box
+
+        compute_distribution_for_frames = (
+            free_energy._compute_distribution_for_frames_with_two_periodic_directions
+        )
+
+        liquid_contact_2d, solid_all = compute_distribution_for_frames(
+            universe,
+            np.array([0]),
+            box,
+            3.0,
+            [0, 1],
+            np.array([10.0, 10.0, 10.0]),
+        )
+
+        np.testing.assert_allclose(liquid_contact_2d, [[1.0, 2.0], [3.0, 4.0]])
+        np.testing.assert_allclose(solid_all, positions[:2].flatten())
+
+
+class TestProjectAtomsOnOpenedTube:
+    def test_returns_only_atoms_outside_minimum_radial_distance(self):
+        positions = np.array(
+            [[1.0, 0.0, 2.0], [0.0, 3.0, 4.0], [-3.0, 0.0, 5.0], [0.0, -3.0, 6.0]],
+            dtype=np.float32,
+        )
+        tube_center = np.array([0.0, 0.0, 1.0])
+        tube_radius = 3.0
+
+        angular_coordinates = np.empty(len(positions))
+        periodic_coordinates = np.empty(len(positions))
+
+        number_of_projected_atoms = free_energy._project_atoms_on_opened_tube(
+            positions,
+            tube_center,
+            0,
+            1,
+            2,
+            2.0 ** 2,
+            tube_radius,
+            np.pi * tube_radius,
+            angular_coordinates,
+            periodic_coordinates,
+        )
+
+        assert number_of_projected_atoms == 3
+        np.testing.assert_allclose(
+            angular_coordinates[:number_of_projected_atoms],
+            [1.5 * np.pi * 3.0, 2 * np.pi * 3.0, 0.5 * np.pi * 3.0],
+        )
+        np.testing.assert_allclose(periodic_coordinates[:number_of_projected_atoms], [4, 5, 6])
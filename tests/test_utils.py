@@ -261,3 +261,61 @@ class TestApplyMinimumImageConventionToInteratomicVectors:
             assert correction
 
             # assert
+
+
+class TestGetPseudoCenterOfMassInAccordanceWithPBC:
+    def test_raises_error_when_unknown_dimension(self):
+        positions = np.zeros((3, 3))
+        masses = np.ones(3)
+
+        with pytest.raises(utils.UndefinedOption):
+            utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+                positions, masses, np.full(3, 10.0), dimension="w"
+            )
+
+    def test_returns_center_of_mass_of_atoms_not_split_by_boundaries(self):
+        positions = np.array([[2.0, 3.0, 4.0], [4.0, 5.0, 7.0], [3.0, 4.0, 1.0]])
+        masses = np.array([1.0, 2.0, 3.0])
+
+        center_of_mass_pbc = utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+            positions, masses, np.full(3, 10.0), dimension="xy"
+        )
+
+        np.testing.assert_allclose(center_of_mass_pbc, np.dot(masses, positions) / np.sum(masses))
+
+    def test_returns_same_center_of_mass_when_atoms_are_split_by_boundaries(self):
+        positions = np.array([[1.0, 5.0, 5.0], [-1.0, 5.0, 5.0], [0.0, 5.0, 8.0]])
+        masses = np.array([1.0, 1.0, 2.0])
+
+        positions_wrapped = np.mod(positions, 10.0)
+
+        center_of_mass_pbc = utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+            positions_wrapped, masses, np.full(3, 10.0), dimension="x"
+        )
+
+        np.testing.assert_allclose(center_of_mass_pbc, [0.0, 5.0, 6.5], atol=1e-12)
+
+    def test_returns_center_of_mass_for_each_frame(self):
+        positions = np.array(
+            [
+                [[1.0, 5.0, 5.0], [-1.0, 5.0, 5.0], [0.0, 5.0, 8.0]],
+                [[2.0, 3.0, 4.0], [4.0, 5.0, 7.0], [3.0, 4.0, 1.0]],
+            ]
+        )
+        masses = np.array([1.0, 1.0, 2.0])
+
+        positions_wrapped = np.mod(positions, 10.0)
+
+        center_of_mass_pbc = utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+            positions_wrapped, masses, np.full(3, 10.0), dimension="x"
+        )
+
+        np.testing.assert_allclose(
+            center_of_mass_pbc,
+            [
+                utils.get_pseudo_center_of_mass_in_accordance_with_pbc(
+                    positions_per_frame, masses, np.full(3, 10.0), dimension="x"
+                )
+                for positions_per_frame in positions_wrapped
+            ],
+        )